@@ -1,68 +1,384 @@
 import math
+import threading
+import time
+from collections import namedtuple
+
+WIN_SCORE = 1000000
+
+# Approximate memory held by one transposition table entry: the dict slot,
+# key, entry tuple, score and the move tuples it keeps alive.
+TT_ENTRY_BYTES = 350
+
+# Transposition table entry flags
+TT_EXACT = 0
+TT_LOWER = 1 # Stored value is a lower bound (search failed high)
+TT_UPPER = 2 # Stored value is an upper bound (search failed low)
+
+# One line of an analysis: the root move, its exact score for the side to move
+# at the root, and the principal variation starting with that move.
+AnalysisLine = namedtuple('AnalysisLine', ['move', 'score', 'pv'])
+
+
+class SearchAborted(Exception):
+    # Raised inside the search when a node limit or stop request is hit
+    pass
+
+
+class SearchStats:
+    # Opt-in search instrumentation. Pass an instance to AIPlayer(stats=...)
+    # and it is filled in during find_best_move/analyse; it is reset at the start of
+    # every search.
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.nodes = 0
+        self.leaf_evals = 0
+        self.tt_hits = 0
+        self.max_ply = 0
+        self.beta_cutoffs = {} # move index -> number of cutoffs it produced
+        self.moves_per_ply = {} # ply -> legal moves generated at that ply
+        self.expanded_per_ply = {} # ply -> nodes whose moves were generated
+        # movegen: get_all_legal_moves (including its is_in_check filtering)
+        # game_over: check_game_over, which runs its own movegen and is_in_check
+        # clone: copying the board; make_move: placing the move on the copy
+        self.phase_times = {'movegen': 0.0, 'game_over': 0.0, 'clone': 0.0,
+                            'make_move': 0.0, 'evaluate': 0.0}
+        self.total_time = 0.0
+
+    def record_cutoff(self, move_index):
+        self.beta_cutoffs[move_index] = self.beta_cutoffs.get(move_index, 0) + 1
+
+    def record_moves(self, ply, num_moves):
+        self.moves_per_ply[ply] = self.moves_per_ply.get(ply, 0) + num_moves
+        self.expanded_per_ply[ply] = self.expanded_per_ply.get(ply, 0) + 1
+
+    def branching_factor(self):
+        return {ply: self.moves_per_ply[ply] / self.expanded_per_ply[ply]
+                for ply in sorted(self.expanded_per_ply)}
+
+    def summary(self):
+        lines = [
+            f"nodes={self.nodes} leaf_evals={self.leaf_evals} tt_hits={self.tt_hits} "
+            f"max_ply={self.max_ply} time={self.total_time:.3f}s"
+        ]
+        if self.total_time > 0:
+            lines.append(f"nps={self.nodes / self.total_time:.0f}")
+        for phase, seconds in self.phase_times.items():
+            lines.append(f"  {phase}: {seconds:.3f}s")
+        for ply, bf in self.branching_factor().items():
+            lines.append(f"  ply {ply}: branching {bf:.2f}")
+        total_cutoffs = sum(self.beta_cutoffs.values())
+        if total_cutoffs:
+            first = self.beta_cutoffs.get(0, 0)
+            lines.append(f"  cutoffs={total_cutoffs} first_move={100.0 * first / total_cutoffs:.1f}%")
+        return "\n".join(lines)
+
 
 class AIPlayer:
-    def __init__(self, depth):
+    def __init__(self, depth, stats=None, on_root_move=None, on_iteration=None,
+                 max_nodes=None, max_memory=None, evaluator=None):
         self.depth = depth
+        # Leaf evaluator with evaluate(board, color) and attach(board), e.g.
+        # nnue_eval.NNUEEvaluator. None uses board.evaluate_board.
+        self.evaluator = evaluator
+        # Both hooks are optional; with stats=None the search does no extra work
+        # beyond a single None check per phase.
+        self.stats = stats
+        # Called as on_root_move(move, eval, stats) after each root move is searched
+        self.on_root_move = on_root_move
+        # Called as on_iteration(depth, lines, stats) after each completed depth
+        self.on_iteration = on_iteration
+        # Resource limits. max_nodes caps the nodes visited per search and
+        # max_memory (bytes) caps the transposition table; once it is full,
+        # existing entries are still updated but no new ones are added.
+        self.max_nodes = max_nodes
+        self.max_memory = max_memory
+        if max_memory is None:
+            self.tt_capacity = None
+        else:
+            self.tt_capacity = max(0, max_memory // TT_ENTRY_BYTES)
+        # Stop token and node limit of the search in progress. Every search
+        # gets its own event, so a stop() that arrives after a search has
+        # returned can't cut the next one short.
+        self._stop_event = threading.Event()
+        self._node_limit = None
+        self.aborted = False
+        self._nodes = 0
+        # position key -> (depth, value, flag, best_move). Values are from the
+        # root player's point of view, so the table is cleared for every search.
+        self.tt = {}
+        self._root_depth = depth
 
     def minimax(self, board, depth, alpha, beta, maximizing_player):
-        board.check_game_over()
+        # Scores are from the point of view of the player to move at the root,
+        # i.e. the player to move here when maximizing_player is True.
+        self._nodes += 1
+        if self._stop_event.is_set() or \
+           (self._node_limit is not None and self._nodes > self._node_limit):
+            raise SearchAborted()
+
+        stats = self.stats
+        if stats is not None:
+            stats.nodes += 1
+            ply = self._root_depth - depth
+            if ply > stats.max_ply:
+                stats.max_ply = ply
+
+        if maximizing_player:
+            root_color = board.current_player
+        else:
+            root_color = 'white' if board.current_player == 'black' else 'black'
+
+        # A position already seen on this line or in the game is scored as a
+        # draw straight away, before check_game_over generates its moves. It
+        # wasn't mate or stalemate the first time, so it isn't now either.
+        if board.repetition_count() >= 2:
+            return 0
+
+        if stats is None:
+            board.check_game_over()
+        else:
+            start = time.perf_counter()
+            board.check_game_over()
+            stats.phase_times['game_over'] += time.perf_counter() - start
 
         if board.game_over:
-            if board.winner == 'white':
-                return 1000000
-            elif board.winner == 'black':
-                return -1000000
-            else:
+            if board.winner == root_color:
+                return WIN_SCORE
+            elif board.winner == 'draw':
                 return 0
+            else:
+                return -WIN_SCORE
         
         if depth == 0:
-            return board.evaluate_board('white' if maximizing_player else 'black')
+            if stats is None:
+                if self.evaluator is not None:
+                    return self.evaluator.evaluate(board, root_color)
+                return board.evaluate_board(root_color)
+            start = time.perf_counter()
+            if self.evaluator is not None:
+                score = self.evaluator.evaluate(board, root_color)
+            else:
+                score = board.evaluate_board(root_color)
+            stats.phase_times['evaluate'] += time.perf_counter() - start
+            stats.leaf_evals += 1
+            return score
+
+        key = board.position_key()
+        tt_move = None
+        entry = self.tt.get(key)
+        if entry is not None:
+            entry_depth, entry_value, entry_flag, tt_move = entry
+            if entry_depth >= depth:
+                if entry_flag == TT_EXACT or \
+                   (entry_flag == TT_LOWER and entry_value >= beta) or \
+                   (entry_flag == TT_UPPER and entry_value <= alpha):
+                    if stats is not None:
+                        stats.tt_hits += 1
+                    return entry_value
+
+        if stats is None:
+            legal_moves = board.get_all_legal_moves()
+        else:
+            start = time.perf_counter()
+            legal_moves = board.get_all_legal_moves()
+            stats.phase_times['movegen'] += time.perf_counter() - start
+            stats.record_moves(ply, len(legal_moves))
 
+        # Try the move that was best here last time first
+        if tt_move is not None and tt_move in legal_moves:
+            legal_moves.remove(tt_move)
+            legal_moves.insert(0, tt_move)
+
+        original_alpha = alpha
+        original_beta = beta
+        best_move = None
 
         if maximizing_player:
-            max_eval = -math.inf
-            for move in board.get_all_legal_moves():
-                temp_board = board.clone()
-                temp_board.make_move(move[0], move[1])
+            best_eval = -math.inf
+            for index, move in enumerate(legal_moves):
+                temp_board = self._child(board, move)
                 
                 eval = self.minimax(temp_board, depth - 1, alpha, beta, False)
-                max_eval = max(max_eval, eval)
+                if eval > best_eval:
+                    best_eval = eval
+                    best_move = move
                 alpha = max(alpha, eval)
                 if beta <= alpha:
+                    if stats is not None:
+                        stats.record_cutoff(index)
                     break
-            return max_eval
         else:
-            min_eval = math.inf
-            for move in board.get_all_legal_moves():
-                temp_board = board.clone()
-                temp_board.make_move(move[0], move[1])
+            best_eval = math.inf
+            for index, move in enumerate(legal_moves):
+                temp_board = self._child(board, move)
                 
                 eval = self.minimax(temp_board, depth - 1, alpha, beta, True)
-                min_eval = min(min_eval, eval)
+                if eval < best_eval:
+                    best_eval = eval
+                    best_move = move
                 beta = min(beta, eval)
                 if beta <= alpha:
+                    if stats is not None:
+                        stats.record_cutoff(index)
                     break
-            return min_eval
 
-    def find_best_move(self, board):
-        best_move = None
-        max_eval = -math.inf
-        alpha = -math.inf
-        beta = math.inf
+        if best_eval <= original_alpha:
+            flag = TT_UPPER
+        elif best_eval >= original_beta:
+            flag = TT_LOWER
+        else:
+            flag = TT_EXACT
+        if self.tt_capacity is None or len(self.tt) < self.tt_capacity or key in self.tt:
+            self.tt[key] = (depth, best_eval, flag, best_move)
 
-        legal_moves = board.get_all_legal_moves()
-        if not legal_moves:
-            return None
+        return best_eval
 
-        for move in legal_moves:
+    def _child(self, board, move):
+        stats = self.stats
+        # Moves come from get_all_legal_moves and minimax runs check_game_over
+        # on the child itself, so apply_move skips make_move's re-validation.
+        if stats is None:
             temp_board = board.clone()
-            temp_board.make_move(move[0], move[1]) 
-            
-            eval = self.minimax(temp_board, self.depth - 1, alpha, beta, False) 
-            
-            if eval > max_eval:
-                max_eval = eval
-                best_move = move
-            alpha = max(alpha, eval) 
-
-        return best_move
\ No newline at end of file
+            temp_board.apply_move(move[0], move[1])
+            return temp_board
+        start = time.perf_counter()
+        temp_board = board.clone()
+        cloned = time.perf_counter()
+        temp_board.apply_move(move[0], move[1])
+        stats.phase_times['clone'] += cloned - start
+        stats.phase_times['make_move'] += time.perf_counter() - cloned
+        return temp_board
+
+    def _principal_variation(self, board, max_length):
+        # Follow the best moves stored in the transposition table
+        pv = []
+        while len(pv) < max_length and not board.game_over:
+            entry = self.tt.get(board.position_key())
+            if entry is None or entry[3] is None:
+                break
+            move = entry[3]
+            next_board = board.clone()
+            if not next_board.make_move(move[0], move[1]):
+                break
+            pv.append(move)
+            board = next_board
+        return pv
+
+    def stop(self):
+        # Ends the search in progress, if any. To stop a search that a worker
+        # thread may not have started yet, pass it a stop_event and set that.
+        self._stop_event.set()
+
+    def _search_root(self, board, root_moves, depth, multipv, lines):
+        # Fills lines in place so a caller catching SearchAborted keeps the
+        # root moves that were fully searched.
+        stats = self.stats
+        for move in root_moves:
+            temp_board = self._child(board, move)
+
+            if len(lines) < multipv:
+                alpha = -math.inf
+            else:
+                alpha = lines[-1].score
+            eval = self.minimax(temp_board, depth - 1, alpha, math.inf, False)
+
+            if eval > alpha:
+                pv = [move] + self._principal_variation(temp_board, depth - 1)
+                lines.append(AnalysisLine(move, eval, pv))
+                # Stable sort keeps the earlier move first on equal scores
+                lines.sort(key=lambda line: line.score, reverse=True)
+                del lines[multipv:]
+
+            if self.on_root_move is not None:
+                if stats is not None:
+                    stats.total_time = time.perf_counter() - self._search_start
+                self.on_root_move(move, eval, stats)
+
+    def analyse(self, board, multipv=1, depth=None, stop_event=None):
+        """Search board and return up to multipv AnalysisLines, best first.
+
+        Every returned score is exact. Root moves are searched with alpha set
+        to the score of the current multipv-th best line, so moves that can't
+        enter the list are refuted as cheaply as in a single-PV search.
+
+        The search deepens one ply at a time. If it is cut short by max_nodes,
+        stop() or stop_event (a threading.Event the caller can create before
+        handing the search to a worker thread), self.aborted is set and the
+        lines of the last completed depth are returned. The depth-1 pass is
+        always completed, so there is at least one searched line.
+        """
+        # Installed first so a stop() from another thread from here on counts
+        self._stop_event = stop_event if stop_event is not None else threading.Event()
+        if multipv < 1:
+            raise ValueError(f"multipv must be at least 1, got {multipv}")
+        if depth is None:
+            depth = self.depth
+        self.tt = {}
+        self._nodes = 0
+        self._node_limit = self.max_nodes
+        self.aborted = False
+        self._search_start = time.perf_counter()
+        return self._deepen(board, multipv, depth)
+
+    def _deepen(self, board, multipv, depth):
+        stats = self.stats
+        if stats is not None:
+            stats.reset()
+            stats.nodes += 1
+
+        if stats is None:
+            legal_moves = board.get_all_legal_moves()
+        else:
+            start = time.perf_counter()
+            legal_moves = board.get_all_legal_moves()
+            stats.phase_times['movegen'] += time.perf_counter() - start
+            stats.record_moves(0, len(legal_moves))
+        if not legal_moves:
+            return []
+
+        if self.evaluator is not None:
+            # Search from a copy so the caller's board doesn't keep paying for
+            # accumulator updates after the search
+            board = board.clone()
+            self.evaluator.attach(board)
+
+        lines = []
+        for iteration_depth in range(1, depth + 1):
+            self._root_depth = iteration_depth
+            # Search the previous depth's best lines first
+            best_moves = [line.move for line in lines]
+            root_moves = best_moves + [move for move in legal_moves if move not in best_moves]
+
+            iteration_lines = []
+            try:
+                self._search_root(board, root_moves, iteration_depth, multipv, iteration_lines)
+            except SearchAborted:
+                self.aborted = True
+                if not lines:
+                    # Nothing complete yet: finish a depth-1 pass without
+                    # limits rather than return an unsearched move
+                    self._stop_event = threading.Event()
+                    self._node_limit = None
+                    self._root_depth = 1
+                    lines = []
+                    self._search_root(board, legal_moves, 1, multipv, lines)
+                break
+            lines = iteration_lines
+
+            if self.on_iteration is not None:
+                if stats is not None:
+                    stats.total_time = time.perf_counter() - self._search_start
+                self.on_iteration(iteration_depth, lines, stats)
+
+        if stats is not None:
+            stats.total_time = time.perf_counter() - self._search_start
+
+        return lines
+
+    def find_best_move(self, board, stop_event=None):
+        lines = self.analyse(board, multipv=1, stop_event=stop_event)
+        if not lines:
+            return None
+        return lines[0].move
@@ -1,16 +1,18 @@
 # gui_game.py (DO NOT RUN DIRECTLY IN COLAB - RUN LOCALLY)
+#
+# Run with `python gui_game.py`. Importing this module has no side effects;
+# RollerballApp opens the display lazily, and RollerballApp(headless=True)
+# renders offscreen for automated tests.
 
 import pygame
 import sys
 import os
+import hashlib
 
 # Assuming rollerball_chess.py and ai_player.py are in the same directory
 from rollerball_chess import RollerballBoard
 from ai_player import AIPlayer
 
-# --- Pygame Setup ---
-pygame.init()
-
 # Screen dimensions
 BOARD_SIZE = 7 # 7x7 board
 SQUARE_SIZE = 80 # Size of each square in pixels
@@ -23,151 +25,241 @@ LIGHT_SQUARE = (238, 238, 210) # Off-white
 DARK_SQUARE = (118, 150, 86) # Green-brown
 HIGHLIGHT_COLOR = (255, 255, 0, 100) # Yellow with transparency for highlights
 
-# Set up the display
-screen = pygame.display.set_mode(SCREEN_DIMENSIONS)
-pygame.display.set_caption("Rollerball Chess AI")
-
-# --- Load Piece Images ---
-# You'll need to create a 'pieces' directory and put chess piece images in it.
-# Example: wP.png (white pawn), bR.png (black rook), etc.
-# Download free chess piece images (e.g., from Wikimedia Commons or Lichess asset packs)
-# and resize them to SQUARE_SIZE.
-PIECE_IMAGES = {}
+# --- Piece Images ---
+# You'll need a 'pieces' directory with chess piece images in it.
+# Example: wP.jpg (white pawn), bR.jpg (black rook), etc.
+# Download free chess piece images (e.g., from Wikimedia Commons or Lichess asset packs).
+# They are scaled to SQUARE_SIZE once and cached as a single sprite atlas,
+# which later launches load instead of decoding every image. The atlas goes in
+# the user cache directory (or $ROLLERBALL_CACHE_DIR, or RollerballApp's
+# cache_dir) so the install itself can be read-only.
+PIECES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pieces')
 piece_filenames = {
     'r': 'bR.jpg', 'n': 'bN.jpg', 'b': 'bB.jpg', 'q': 'bQ.jpg', 'k': 'bK.jpg', 'p': 'bP.jpg',
     'R': 'wR.jpg', 'N': 'wN.jpg', 'B': 'wB.jpg', 'Q': 'wQ.jpg', 'K': 'wK.jpg', 'P': 'wP.jpg'
 }
 
-for piece_char, filename in piece_filenames.items():
+
+def default_cache_dir():
+    if os.environ.get('ROLLERBALL_CACHE_DIR'):
+        return os.environ['ROLLERBALL_CACHE_DIR']
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'rollerball_chess')
+
+
+def atlas_path(square_size=SQUARE_SIZE, cache_dir=None):
+    if cache_dir is None:
+        cache_dir = default_cache_dir()
+    # Keyed on the pieces directory so several installs can share one cache
+    source_key = hashlib.sha1(PIECES_DIR.encode()).hexdigest()[:8]
+    return os.path.join(cache_dir, f"atlas_{square_size}_{source_key}.png")
+
+
+def build_piece_atlas(square_size=SQUARE_SIZE):
+    # One row of square_size tiles in piece_filenames order
+    atlas = pygame.Surface((square_size * len(piece_filenames), square_size), pygame.SRCALPHA)
+    for i, filename in enumerate(piece_filenames.values()):
+        try:
+            image = pygame.image.load(os.path.join(PIECES_DIR, filename))
+        except (pygame.error, FileNotFoundError) as e:
+            raise type(e)(
+                f"Error loading image {filename}: {e}\n"
+                "Make sure you have a 'pieces' folder in the same directory as gui_game.py\n"
+                "And that it contains images named like bR.jpg, wK.jpg, etc."
+            ) from e
+        atlas.blit(pygame.transform.scale(image, (square_size, square_size)), (i * square_size, 0))
+    return atlas
+
+
+def load_piece_atlas(square_size=SQUARE_SIZE, cache_dir=None):
+    path = atlas_path(square_size, cache_dir)
+    sources = [os.path.join(PIECES_DIR, filename) for filename in piece_filenames.values()]
     try:
-        path = os.path.join('pieces', filename)
-        image = pygame.image.load(path).convert_alpha()
-        PIECE_IMAGES[piece_char] = pygame.transform.scale(image, (SQUARE_SIZE, SQUARE_SIZE))
-    except pygame.error as e:
-        print(f"Error loading image {filename}: {e}")
-        print("Make sure you have a 'pieces' folder in the same directory as gui_game.py")
-        print("And that it contains images named like bR.png, wK.png, etc.")
-        sys.exit()
-
-# --- Game State Variables ---
-game_board = RollerballBoard()
-ai_player = AIPlayer(depth=3) # AI depth
-
-selected_square = None # (row, col) of the currently selected piece
-valid_moves_for_selected = [] # List of (from_sq, to_sq) tuples for the selected piece
-
-# --- Drawing Functions ---
-def draw_board():
-    for r in range(BOARD_SIZE):
-        for c in range(BOARD_SIZE):
-            color = LIGHT_SQUARE if (r + c) % 2 == 0 else DARK_SQUARE
-            pygame.draw.rect(screen, color, (c * SQUARE_SIZE, r * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
-
-def draw_pieces():
-    for r in range(BOARD_SIZE):
-        for c in range(BOARD_SIZE):
-            piece_char = game_board.get_piece(r, c)
-            if piece_char != '.':
-                screen.blit(PIECE_IMAGES[piece_char], (c * SQUARE_SIZE, r * SQUARE_SIZE))
-
-def highlight_squares():
-    if selected_square:
-        r, c = selected_square
-        # Highlight selected square
-        s = pygame.Surface((SQUARE_SIZE, SQUARE_SIZE), pygame.SRCALPHA) # Create a transparent surface
-        s.fill(HIGHLIGHT_COLOR)
-        screen.blit(s, (c * SQUARE_SIZE, r * SQUARE_SIZE))
+        if os.path.getmtime(path) >= max(os.path.getmtime(source) for source in sources):
+            return pygame.image.load(path)
+    except (OSError, pygame.error):
+        pass # No usable cache yet
+
+    atlas = build_piece_atlas(square_size)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        pygame.image.save(atlas, path)
+    except (OSError, pygame.error) as e:
+        print(f"Could not cache piece atlas at {path}: {e}")
+    return atlas
+
+
+def load_piece_images(square_size=SQUARE_SIZE, cache_dir=None):
+    atlas = load_piece_atlas(square_size, cache_dir)
+    if pygame.display.get_surface() is not None:
+        atlas = atlas.convert_alpha() # Match the display format for fast blits
+    return {
+        piece_char: atlas.subsurface((i * square_size, 0, square_size, square_size))
+        for i, piece_char in enumerate(piece_filenames)
+    }
+
+
+class RollerballApp:
+    def __init__(self, ai_depth=3, headless=False, cache_dir=None):
+        self.headless = headless
+        self.cache_dir = cache_dir # Piece atlas cache; None uses default_cache_dir()
+        self.game_board = RollerballBoard()
+        self.ai_player = AIPlayer(depth=ai_depth)
+
+        self.selected_square = None # (row, col) of the currently selected piece
+        self.valid_moves_for_selected = [] # List of (from_sq, to_sq) tuples for the selected piece
+        self.ai_thinking = False
+        self.running = True
+
+        # Created by init_display() on first use
+        self.screen = None
+        self.piece_images = None
+        self.font = None
+
+    def init_display(self):
+        if self.screen is not None:
+            return
+        if self.headless:
+            # Overrides any driver already set in the environment (x11, wayland...)
+            os.environ['SDL_VIDEODRIVER'] = 'dummy'
+        # Only the modules the GUI uses; pygame.init() would also start audio etc.
+        pygame.display.init()
+        pygame.font.init()
+        self.screen = pygame.display.set_mode(SCREEN_DIMENSIONS)
+        pygame.display.set_caption("Rollerball Chess AI")
+        self.piece_images = load_piece_images(SQUARE_SIZE, self.cache_dir)
+        self.font = pygame.font.Font(None, 74)
+
+    # --- Drawing Functions ---
+    def draw_board(self):
+        for r in range(BOARD_SIZE):
+            for c in range(BOARD_SIZE):
+                color = LIGHT_SQUARE if (r + c) % 2 == 0 else DARK_SQUARE
+                pygame.draw.rect(self.screen, color, (c * SQUARE_SIZE, r * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
+
+    def draw_pieces(self):
+        for r in range(BOARD_SIZE):
+            for c in range(BOARD_SIZE):
+                piece_char = self.game_board.get_piece(r, c)
+                if piece_char != '.':
+                    self.screen.blit(self.piece_images[piece_char], (c * SQUARE_SIZE, r * SQUARE_SIZE))
+
+    def highlight_squares(self):
+        if self.selected_square:
+            r, c = self.selected_square
+            # Highlight selected square
+            s = pygame.Surface((SQUARE_SIZE, SQUARE_SIZE), pygame.SRCALPHA) # Create a transparent surface
+            s.fill(HIGHLIGHT_COLOR)
+            self.screen.blit(s, (c * SQUARE_SIZE, r * SQUARE_SIZE))
+            
+            # Highlight valid target squares
+            for _, target_sq in self.valid_moves_for_selected:
+                tr, tc = target_sq
+                s_target = pygame.Surface((SQUARE_SIZE, SQUARE_SIZE), pygame.SRCALPHA)
+                s_target.fill((0, 255, 0, 100)) # Green highlight for legal moves
+                self.screen.blit(s_target, (tc * SQUARE_SIZE, tr * SQUARE_SIZE))
+
+    def draw_game_over(self):
+        message = ""
+        if self.game_board.winner == 'draw':
+            message = "Draw!"
+        elif self.game_board.winner:
+            message = f"{self.game_board.winner.upper()} Wins!"
         
-        # Highlight valid target squares
-        for _, target_sq in valid_moves_for_selected:
-            tr, tc = target_sq
-            s_target = pygame.Surface((SQUARE_SIZE, SQUARE_SIZE), pygame.SRCALPHA)
-            s_target.fill((0, 255, 0, 100)) # Green highlight for legal moves
-            screen.blit(s_target, (tc * SQUARE_SIZE, tr * SQUARE_SIZE))
+        text_surface = self.font.render(message, True, (255, 0, 0)) # Red text
+        text_rect = text_surface.get_rect(center=(BOARD_WIDTH // 2, BOARD_HEIGHT // 2))
+        self.screen.blit(text_surface, text_rect)
 
+    def render(self):
+        self.init_display()
+        self.draw_board()
+        self.highlight_squares() # Draw highlights after board, before pieces
+        self.draw_pieces()
+        # Check for game over (and display message)
+        if self.game_board.game_over:
+            self.draw_game_over()
+        return self.screen
 
-# --- Main Game Loop ---
-running = True
-ai_thinking = False
+    # --- Input and AI ---
+    def handle_click(self, pos):
+        if self.ai_thinking or self.game_board.game_over or \
+           self.game_board.current_player != 'white': # Human's turn only
+            return
+        mx, my = pos
+        clicked_row, clicked_col = my // SQUARE_SIZE, mx // SQUARE_SIZE
+        
+        if self.selected_square: # A piece is already selected
+            # Try to move the selected piece to the clicked square
+            if self.game_board.make_move(self.selected_square, (clicked_row, clicked_col)):
+                print(f"Human moved from {self.selected_square} to {(clicked_row, clicked_col)}")
+                # Move made, prepare for AI turn
+                self.ai_thinking = True # Signal AI to make its move
+            else:
+                # Illegal move attempt
+                print("Illegal move. Please try again.")
+            # Clear selection either way
+            self.selected_square = None
+            self.valid_moves_for_selected = []
+        else: # No piece selected, try to select one
+            piece = self.game_board.get_piece(clicked_row, clicked_col)
+            if piece != '.' and self.game_board.get_piece_color(piece) == 'white':
+                self.selected_square = (clicked_row, clicked_col)
+                # get_all_legal_moves() gets ALL moves for the current player,
+                # so filter it for the selected piece.
+                all_legal_moves = self.game_board.get_all_legal_moves()
+                self.valid_moves_for_selected = [m for m in all_legal_moves if m[0] == self.selected_square]
+            else:
+                self.selected_square = None # Clicked empty square or opponent's piece
+                self.valid_moves_for_selected = []
 
-while running:
-    for event in pygame.event.get():
+    def handle_event(self, event):
         if event.type == pygame.QUIT:
-            running = False
-
-        if not ai_thinking and game_board.current_player == 'white': # Human's turn
-            if event.type == pygame.MOUSEBUTTONDOWN:
-                mx, my = event.pos
-                clicked_row, clicked_col = my // SQUARE_SIZE, mx // SQUARE_SIZE
-                
-                if selected_square: # A piece is already selected
-                    # Try to move the selected piece to the clicked square
-                    move = (selected_square, (clicked_row, clicked_col))
-                    if game_board.make_move(selected_square, (clicked_row, clicked_col)):
-                        print(f"Human moved from {selected_square} to {(clicked_row, clicked_col)}")
-                        # Move made, clear selection and prepare for AI turn
-                        selected_square = None
-                        valid_moves_for_selected = []
-                        ai_thinking = True # Signal AI to make its move
-                    else:
-                        # Illegal move attempt
-                        print("Illegal move. Please try again.")
-                        selected_square = None # Clear selection for new attempt
-                        valid_moves_for_selected = []
-                else: # No piece selected, try to select one
-                    piece = game_board.get_piece(clicked_row, clicked_col)
-                    if piece != '.' and game_board.get_piece_color(piece) == 'white':
-                        selected_square = (clicked_row, clicked_col)
-                        # Generate and store valid moves for the selected piece to highlight
-                        # NOTE: game_board.get_all_legal_moves() gets ALL moves for the current player
-                        # We need to filter this for the selected piece.
-                        all_legal_moves = game_board.get_all_legal_moves()
-                        valid_moves_for_selected = [m for m in all_legal_moves if m[0] == selected_square]
-                    else:
-                        selected_square = None # Clicked empty square or opponent's piece
-                        valid_moves_for_selected = []
-
-    # AI's Turn (Outside event loop to allow AI to think)
-    if ai_thinking and game_board.current_player == 'black':
+            self.running = False
+        elif event.type == pygame.MOUSEBUTTONDOWN:
+            self.handle_click(event.pos)
+
+    def play_ai_move(self):
         print("AI is thinking...")
-        pygame.time.wait(500) # Small visual pause
-        best_move = ai_player.find_best_move(game_board)
+        best_move = self.ai_player.find_best_move(self.game_board)
         if best_move:
             print(f"AI chose move: {best_move[0]} to {best_move[1]}")
-            game_board.make_move(best_move[0], best_move[1])
+            self.game_board.make_move(best_move[0], best_move[1])
         else:
             print("AI has no legal moves. Game might be over.")
-            game_board.check_game_over() # Ensure game_over state is updated
-
-        ai_thinking = False # AI finished its turn
-
-    # Drawing
-    draw_board()
-    highlight_squares() # Draw highlights after board, before pieces
-    draw_pieces()
-    
-    # Check for game over (and display message)
-    if game_board.game_over:
-        font = pygame.font.Font(None, 74)
-        message = ""
-        if game_board.winner == 'draw':
-            message = "Draw!"
-        elif game_board.winner:
-            message = f"{game_board.winner.upper()} Wins!"
-        
-        text_surface = font.render(message, True, (255, 0, 0)) # Red text
-        text_rect = text_surface.get_rect(center=(BOARD_WIDTH // 2, BOARD_HEIGHT // 2))
-        screen.blit(text_surface, text_rect)
+            self.game_board.check_game_over() # Ensure game_over state is updated
+
+        self.ai_thinking = False # AI finished its turn
+
+    # --- Main Game Loop ---
+    def run(self):
+        self.init_display()
+        while self.running:
+            for event in pygame.event.get():
+                self.handle_event(event)
+
+            # AI's Turn (Outside event loop to allow AI to think)
+            if self.ai_thinking and not self.game_board.game_over and \
+               self.game_board.current_player == 'black':
+                if not self.headless:
+                    pygame.time.wait(500) # Small visual pause
+                self.play_ai_move()
 
-    pygame.display.flip() # Update the full display
+            self.render()
+            pygame.display.flip() # Update the full display
+            # The game over message stays on screen until the window is closed
+
+        # Quit Pygame
+        pygame.quit()
+
+
+def main():
+    try:
+        RollerballApp().run()
+    except (pygame.error, FileNotFoundError) as e:
+        print(e)
+        sys.exit(1)
+    sys.exit()
 
-    # Optionally, allow restarting the game
-    if game_board.game_over and not ai_thinking:
-        # After game over, wait for a short period and then offer to restart
-        # For simplicity in this template, we'll just exit.
-        # In a real game, you'd add buttons or a prompt.
-        pass # Keep game over message on screen until quit
 
-# Quit Pygame
-pygame.quit()
-sys.exit()
\ No newline at end of file
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+# nnue_eval.py - a small piece-square network as an alternative to
+# RollerballBoard.evaluate_board.
+#
+# The network has one input per (piece, square) pair, a hidden layer whose
+# pre-activations (the accumulator) are kept on the board and updated on every
+# set_piece, and a single linear output:
+#
+#   accumulator = b1 + sum(W1[feature] for each piece on the board)   (int16)
+#   score = (clip(accumulator, 0, clip_max) . W2 + b2) / output_scale (int32)
+#
+# The score is from white's point of view. Use it with AIPlayer(evaluator=...).
+#
+# Usage:
+#   python nnue_eval.py init [path]    write weights equivalent to material + PST
+#   python nnue_eval.py bench [path]   compare speed and scores with evaluate_board
+
+import argparse
+import os
+import struct
+import sys
+import time
+
+import numpy as np
+
+from rollerball_chess import RollerballBoard, PIECE_VALUES, PIECE_SQUARE_TABLES
+
+DEFAULT_WEIGHTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rollerball.nnue')
+
+PIECES = 'PNBRQKpnbrqk'
+PIECE_INDEX = {piece: i for i, piece in enumerate(PIECES)}
+NUM_INPUTS = len(PIECES) * 49
+
+# File layout (little-endian): magic, version, hidden size, clip_max,
+# output_scale, then W1 (NUM_INPUTS x hidden int16), b1 (int16), W2 (int16)
+# and b2 (int32).
+MAGIC = b'RBNN'
+VERSION = 1
+HEADER = struct.Struct('<4sIIii')
+
+# A side never has more than 14 pieces (7 pawns, 7 pieces), one of them the king
+MAX_PIECES_PER_SIDE = 14
+
+
+def feature_index(r, c, piece):
+    return PIECE_INDEX[piece] * 49 + r * 7 + c
+
+
+class NNUEEvaluator:
+    def __init__(self, w1, b1, w2, b2, clip_max, output_scale):
+        self.w1 = np.ascontiguousarray(w1, dtype=np.int16)
+        self.b1 = np.asarray(b1, dtype=np.int16)
+        self.w2 = np.asarray(w2, dtype=np.int32) # Widened once so the output dot runs in int32
+        self.b2 = int(b2)
+        self.clip_max = clip_max
+        self.output_scale = output_scale
+
+    def check_range(self):
+        # int16/int32 arithmetic wraps silently, so reject weights whose
+        # accumulator or output could overflow in any reachable position.
+        if not 0 < self.clip_max <= 32767:
+            raise ValueError(f"clip_max must be in 1..32767, got {self.clip_max}")
+        if self.output_scale == 0:
+            raise ValueError("output_scale must not be 0")
+        rows = np.abs(self.w1.astype(np.int64)).reshape(len(PIECES), 49, -1)
+        # Largest contribution of each piece to each hidden unit, over squares
+        per_piece = rows.max(axis=1)
+        worst = np.abs(self.b1.astype(np.int64))
+        for side in (PIECES[:6], PIECES[6:]):
+            king = PIECE_INDEX[side[5]]
+            others = [PIECE_INDEX[piece] for piece in side[:5]]
+            worst = worst + per_piece[king] + (MAX_PIECES_PER_SIDE - 1) * per_piece[others].max(axis=0)
+        if worst.max() > 32767:
+            unit = int(worst.argmax())
+            raise ValueError(f"hidden unit {unit} can reach {int(worst.max())}, "
+                             "which overflows the int16 accumulator")
+        output = self.clip_max * int(np.abs(self.w2.astype(np.int64)).sum()) + abs(self.b2)
+        if output > 2 ** 31 - 1:
+            raise ValueError(f"output can reach {output}, which overflows int32")
+
+    @classmethod
+    def load(cls, path=DEFAULT_WEIGHTS_FILE):
+        with open(path, 'rb') as f:
+            data = f.read()
+        if len(data) < HEADER.size:
+            raise ValueError(f"{path} is too short to be a Rollerball network")
+        magic, version, hidden, clip_max, output_scale = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} Rollerball network")
+        expected = HEADER.size + 2 * (NUM_INPUTS * hidden + 2 * hidden) + 4
+        if len(data) != expected:
+            raise ValueError(f"{path} is {len(data)} bytes; a network with {hidden} "
+                             f"hidden units should be {expected}")
+        offset = HEADER.size
+        w1 = np.frombuffer(data, dtype='<i2', count=NUM_INPUTS * hidden, offset=offset)
+        offset += w1.nbytes
+        b1 = np.frombuffer(data, dtype='<i2', count=hidden, offset=offset)
+        offset += b1.nbytes
+        w2 = np.frombuffer(data, dtype='<i2', count=hidden, offset=offset)
+        offset += w2.nbytes
+        (b2,) = struct.unpack_from('<i', data, offset)
+        evaluator = cls(w1.reshape(NUM_INPUTS, hidden), b1, w2, b2, clip_max, output_scale)
+        evaluator.check_range()
+        return evaluator
+
+    def save(self, path=DEFAULT_WEIGHTS_FILE):
+        self.check_range()
+        hidden = len(self.b1)
+        with open(path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, hidden, self.clip_max, self.output_scale))
+            f.write(self.w1.astype('<i2').tobytes())
+            f.write(self.b1.astype('<i2').tobytes())
+            f.write(self.w2.astype('<i2').tobytes())
+            f.write(struct.pack('<i', self.b2))
+
+    def refresh(self, board):
+        # Full recomputation; only needed when attaching to a board
+        accumulator = self.b1.copy()
+        for r in range(7):
+            for c in range(7):
+                piece = board.board[r][c]
+                if piece != '.':
+                    accumulator += self.w1[feature_index(r, c, piece)]
+        return accumulator
+
+    def attach(self, board):
+        board.accumulator = self.refresh(board)
+        board.nnue = self
+
+    def update(self, accumulator, r, c, old_piece, new_piece):
+        # Called from RollerballBoard.set_piece
+        if old_piece != '.':
+            accumulator -= self.w1[feature_index(r, c, old_piece)]
+        if new_piece != '.':
+            accumulator += self.w1[feature_index(r, c, new_piece)]
+
+    def evaluate(self, board, player_color_for_eval):
+        # Same signature and sign convention as evaluate_board
+        hidden = np.clip(board.accumulator, 0, self.clip_max).astype(np.int32)
+        score = (int(hidden @ self.w2) + self.b2) / self.output_scale
+        if player_color_for_eval == 'black':
+            score = -score
+        return score
+
+
+def from_tables(offset=8000):
+    # Two hidden units holding +/- (material + PST) around a common offset,
+    # so the output equals the linear part of evaluate_board (king on its
+    # middle-game table). A starting point and benchmark baseline, not a
+    # trained network.
+    w1 = np.zeros((NUM_INPUTS, 2), dtype=np.int16)
+    for piece in PIECES:
+        kind = piece.upper()
+        table = PIECE_SQUARE_TABLES['K_MIDDLE_GAME' if kind == 'K' else kind]
+        is_white = piece.isupper()
+        for r in range(7):
+            for c in range(7):
+                r_effective = r if is_white else 6 - r
+                pst_value = table[r_effective][c]
+                value = PIECE_VALUES[piece] + (pst_value if is_white else -pst_value)
+                w1[feature_index(r, c, piece)] = (value, -value)
+    return NNUEEvaluator(w1, [offset, offset], [1, -1], 0, clip_max=32767, output_scale=2)
+
+
+def bench(path, positions=200, plies=30):
+    import random
+    evaluator = NNUEEvaluator.load(path)
+    rng = random.Random(0)
+    boards = []
+    while len(boards) < positions:
+        board = RollerballBoard()
+        evaluator.attach(board)
+        for _ in range(rng.randrange(1, plies)):
+            moves = board.get_all_legal_moves()
+            if board.game_over or not moves:
+                break
+            move = rng.choice(moves)
+            board.make_move(move[0], move[1])
+        boards.append(board)
+
+    start = time.perf_counter()
+    handcrafted = [board.evaluate_board('white') for board in boards]
+    handcrafted_time = time.perf_counter() - start
+    start = time.perf_counter()
+    network = [evaluator.evaluate(board, 'white') for board in boards]
+    network_time = time.perf_counter() - start
+
+    board = boards[-1].clone()
+    start = time.perf_counter()
+    for _ in range(1000):
+        evaluator.update(board.accumulator, 3, 3, '.', 'N')
+        evaluator.update(board.accumulator, 3, 3, 'N', '.')
+    update_time = (time.perf_counter() - start) / 2000
+
+    for board in boards:
+        if not np.array_equal(board.accumulator, evaluator.refresh(board)):
+            raise RuntimeError("Incremental accumulator drifted from a full refresh")
+
+    print(f"{len(boards)} positions")
+    print(f"evaluate_board: {1e6 * handcrafted_time / len(boards):.1f} us/position")
+    print(f"network:        {1e6 * network_time / len(boards):.1f} us/position "
+          f"(+{1e6 * update_time:.1f} us per changed square)")
+    print(f"score correlation: {np.corrcoef(handcrafted, network)[0, 1]:.3f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rollerball NNUE evaluator tools.")
+    parser.add_argument('command', choices=['init', 'bench'])
+    parser.add_argument('path', nargs='?', default=DEFAULT_WEIGHTS_FILE)
+    args = parser.parse_args(argv)
+
+    if args.command == 'init':
+        from_tables().save(args.path)
+        print(f"Wrote {args.path}")
+    else:
+        bench(args.path)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
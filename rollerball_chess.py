@@ -1,5 +1,149 @@
 # rollerball_chess.py (Fixing the IndexError in get_piece)
+import json
 import math
+import os
+import random
+
+# Zobrist keys for position hashing. A fixed seed keeps hashes stable between runs.
+_zobrist_rng = random.Random(0x52424348)
+ZOBRIST_PIECES = {
+    piece: [[_zobrist_rng.getrandbits(64) for _ in range(7)] for _ in range(7)]
+    for piece in 'PNBRQKpnbrqk'
+}
+ZOBRIST_BLACK_TO_MOVE = _zobrist_rng.getrandbits(64)
+
+# Draw rules
+REPETITION_LIMIT = 3 # Threefold repetition ends the game
+NO_PROGRESS_LIMIT = 100 # Plies without a capture or pawn move (fifty-move rule)
+
+# Evaluation weights. Material is signed (white positive); the piece-square
+# tables are from white's point of view and mirrored for black. Tuned values
+# from tune_eval.py are loaded over these at import when eval_weights.json
+# exists next to this file.
+PIECE_VALUES = {
+    'P': 10, 'N': 30, 'B': 30, 'R': 50, 'Q': 90, 'K': 900,
+    'p': -10, 'n': -30, 'b': -30, 'r': -50, 'q': -90, 'k': -900
+}
+
+PAWN_PST = [
+    [0,  0,  0,  0,  0,  0,  0],
+    [50, 50, 50, 50, 50, 50, 50],
+    [10, 10, 20, 30, 20, 10, 10],
+    [ 5,  5, 10, 25, 10,  5,  5],
+    [ 0,  0,  0, 20,  0,  0,  0],
+    [ 5, -5,-10,  0, -10, -5,  5],
+    [ 0,  0,  0,  0,  0,  0,  0]
+]
+
+KNIGHT_PST = [
+    [-50,-40,-30,-30,-30,-40,-50],
+    [-40,-20,  0,  0,  0,-20,-40],
+    [-30,  0, 10, 15, 10,  0,-30],
+    [-30,  5, 15, 20, 15,  5,-30],
+    [-30,  0, 15, 20, 15,  0,-30],
+    [-40,-20,  0,  5,  0,-20,-40],
+    [-50,-40,-30,-30,-30,-40,-50]
+]
+
+BISHOP_PST = [
+    [-20,-10,-10,-10,-10,-10,-20],
+    [-10,  0,  0,  0,  0,  0,-10],
+    [-10,  0,  5, 10,  5,  0,-10],
+    [-10,  5,  5, 10,  5,  5,-10],
+    [-10,  0, 10, 10, 10,  0,-10],
+    [-10, 10,  0,  0,  0, 10,-10],
+    [-20,-10,-10,-10,-10,-10,-20]
+]
+
+ROOK_PST = [
+    [ 0,  0,  0,  5,  0,  0,  0],
+    [-5,  0,  0,  0,  0,  0, -5],
+    [-5,  0,  0,  0,  0,  0, -5],
+    [-5,  0,  0,  0,  0,  0, -5],
+    [-5,  0,  0,  0,  0,  0, -5],
+    [-5,  0,  0,  0,  0,  0, -5],
+    [ 0,  0,  0,  5,  0,  0,  0]
+]
+
+QUEEN_PST = [
+    [-20,-10,-10, -5, -10,-10,-20],
+    [-10,  0,  0,  0,  0,  0,-10],
+    [-10,  0,  5,  5,  5,  0,-10],
+    [ -5,  0,  5,  5,  5,  0, -5],
+    [  0,  0,  5,  5,  5,  0, -5],
+    [-10,  5,  0,  0,  0,  5,-10],
+    [-20,-10,-10, -5,-10,-10,-20]
+]
+
+KING_PST_MIDDLE_GAME = [
+    [-30,-40,-40,-50,-40,-40,-30],
+    [-30,-40,-40,-50,-40,-40,-30],
+    [-30,-40,-40,-50,-40,-40,-30],
+    [-30,-40,-40,-50,-40,-40,-30],
+    [-20,-30,-30,-40,-30,-30,-20],
+    [-10,-20,-20,-20,-20,-20,-10],
+    [ 20, 30, 10,  0, 10, 30, 20]
+]
+
+KING_PST_END_GAME = [
+    [-50,-40,-30,-20,-30,-40,-50],
+    [-30,-20,-10,  0,-10,-20,-30],
+    [-30,-10, 20, 30, 20,-10,-30],
+    [-30,-10, 30, 40, 30,-10,-30],
+    [-30,-10, 30, 40, 30,-10,-30],
+    [-30,-20,-10,  0,-10,-20,-30],
+    [-50,-40,-30,-20,-30,-40,-50]
+]
+
+PIECE_SQUARE_TABLES = {
+    'P': PAWN_PST, 'N': KNIGHT_PST, 'B': BISHOP_PST, 'R': ROOK_PST, 'Q': QUEEN_PST,
+    'K_MIDDLE_GAME': KING_PST_MIDDLE_GAME, 'K_END_GAME': KING_PST_END_GAME
+}
+
+EVAL_WEIGHTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'eval_weights.json')
+
+def _check_eval_weights(weights, path):
+    def is_number(value):
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+    if not isinstance(weights, dict) or set(weights) - {'piece_values', 'pst'}:
+        raise ValueError(f"{path}: expected an object with 'piece_values' and 'pst'")
+    for piece, value in weights.get('piece_values', {}).items():
+        if piece not in 'PNBRQK' or len(piece) != 1:
+            raise ValueError(f"{path}: unknown piece {piece!r}")
+        if not is_number(value):
+            raise ValueError(f"{path}: value for {piece!r} is not a number")
+    for name, table in weights.get('pst', {}).items():
+        if name not in PIECE_SQUARE_TABLES:
+            raise ValueError(f"{path}: unknown piece-square table {name!r}")
+        if not isinstance(table, list) or len(table) != 7 or \
+           any(not isinstance(row, list) or len(row) != 7 or not all(is_number(v) for v in row)
+               for row in table):
+            raise ValueError(f"{path}: piece-square table {name!r} must be 7x7 numbers")
+
+def load_eval_weights(path=EVAL_WEIGHTS_FILE):
+    # Tables are updated in place so existing references stay valid. The whole
+    # file is checked first so a bad one leaves the tables untouched.
+    with open(path) as f:
+        weights = json.load(f)
+    _check_eval_weights(weights, path)
+    for piece, value in weights.get('piece_values', {}).items():
+        PIECE_VALUES[piece.upper()] = value
+        PIECE_VALUES[piece.lower()] = -value
+    for name, table in weights.get('pst', {}).items():
+        for r in range(7):
+            PIECE_SQUARE_TABLES[name][r][:] = table[r]
+
+def save_eval_weights(path=EVAL_WEIGHTS_FILE):
+    weights = {
+        'piece_values': {piece: value for piece, value in PIECE_VALUES.items() if piece.isupper()},
+        'pst': {name: [row[:] for row in table] for name, table in PIECE_SQUARE_TABLES.items()}
+    }
+    with open(path, 'w') as f:
+        json.dump(weights, f, indent=1)
+
+if os.path.exists(EVAL_WEIGHTS_FILE):
+    load_eval_weights()
 
 class RollerballBoard:
     def __init__(self):
@@ -15,6 +159,39 @@ class RollerballBoard:
         self.current_player = 'white'
         self.game_over = False
         self.winner = None
+        self.hash = self.compute_hash()
+        # Plies since the last capture or pawn move, and how often each position
+        # occurred in that span. Earlier positions can never repeat, so the
+        # counts are cleared on every irreversible move and stay small.
+        self.halfmove_clock = 0
+        self.position_counts = {self.position_key(): 1}
+        # Optional incrementally updated evaluator state (see nnue_eval.py).
+        # When nnue is set, set_piece keeps accumulator in step with the board.
+        self.nnue = None
+        self.accumulator = None
+
+    def compute_hash(self):
+        h = 0
+        for r in range(7):
+            for c in range(7):
+                piece = self.board[r][c]
+                if piece != '.':
+                    h ^= ZOBRIST_PIECES[piece][r][c]
+        return h
+
+    def position_key(self):
+        # self.hash only covers piece placement; fold in the side to move here
+        # so temporary current_player swaps don't need to touch the hash.
+        if self.current_player == 'black':
+            return self.hash ^ ZOBRIST_BLACK_TO_MOVE
+        return self.hash
+
+    def repetition_count(self):
+        return self.position_counts.get(self.position_key(), 0)
+
+    def is_draw_by_rule(self):
+        return self.repetition_count() >= REPETITION_LIMIT or \
+               self.halfmove_clock >= NO_PROGRESS_LIMIT
 
     def print_board(self):
         # This function is not used by gui_game.py, so no change needed here.
@@ -51,6 +228,13 @@ class RollerballBoard:
 
     def set_piece(self, r, c, piece):
         wrapped_r, wrapped_c = self.wrap_coords(r, c)
+        old_piece = self.board[wrapped_r][wrapped_c]
+        if old_piece != '.':
+            self.hash ^= ZOBRIST_PIECES[old_piece][wrapped_r][wrapped_c]
+        if piece != '.':
+            self.hash ^= ZOBRIST_PIECES[piece][wrapped_r][wrapped_c]
+        if self.nnue is not None:
+            self.nnue.update(self.accumulator, wrapped_r, wrapped_c, old_piece, piece)
         self.board[wrapped_r][wrapped_c] = piece
 
     def clone(self):
@@ -59,6 +243,22 @@ class RollerballBoard:
         new_board.current_player = self.current_player
         new_board.game_over = self.game_over
         new_board.winner = self.winner
+        new_board.hash = self.hash
+        new_board.halfmove_clock = self.halfmove_clock
+        new_board.position_counts = self.position_counts.copy()
+        if self.nnue is not None:
+            new_board.nnue = self.nnue
+            new_board.accumulator = self.accumulator.copy()
+        return new_board
+
+    def _scratch_copy(self):
+        # Placement-only copy for legality tests; skips the draw bookkeeping
+        # that clone() carries along.
+        new_board = RollerballBoard.__new__(RollerballBoard)
+        new_board.board = [row[:] for row in self.board]
+        new_board.current_player = self.current_player
+        new_board.hash = self.hash
+        new_board.nnue = None
         return new_board
 
     def get_piece_color(self, piece):
@@ -286,7 +486,7 @@ class RollerballBoard:
         
         valid_moves = []
         for start, end in all_pseudo_moves:
-            temp_board = self.clone()
+            temp_board = self._scratch_copy()
             original_piece = temp_board.get_piece(start[0], start[1])
             
             temp_board.set_piece(end[0], end[1], original_piece)
@@ -297,6 +497,10 @@ class RollerballBoard:
         return valid_moves
 
     def make_move(self, start_pos, end_pos):
+        # A rule-based draw ends the game while legal moves remain
+        if self.game_over:
+            return False
+
         r1, c1 = start_pos
         r2, c2 = end_pos
 
@@ -312,6 +516,21 @@ class RollerballBoard:
         if (start_pos, end_pos) not in all_legal_moves_for_current_player:
             return False
 
+        self.apply_move(start_pos, end_pos)
+
+        self.check_game_over()
+
+        return True
+
+    def apply_move(self, start_pos, end_pos):
+        # Plays a move already known to be legal (e.g. from get_all_legal_moves)
+        # without re-validating it or updating game_over; the search relies on
+        # this to avoid generating every move list twice.
+        r1, c1 = start_pos
+        r2, c2 = end_pos
+        piece = self.get_piece(r1, c1)
+
+        captured = self.get_piece(r2, c2)
         self.set_piece(r2, c2, piece)
         self.set_piece(r1, c1, '.')
 
@@ -322,9 +541,13 @@ class RollerballBoard:
 
         self.current_player = 'black' if self.current_player == 'white' else 'white'
 
-        self.check_game_over()
-
-        return True
+        if piece.upper() == 'P' or captured != '.':
+            self.halfmove_clock = 0
+            self.position_counts = {}
+        else:
+            self.halfmove_clock += 1
+        key = self.position_key()
+        self.position_counts[key] = self.position_counts.get(key, 0) + 1
 
     def check_game_over(self):
         legal_moves_for_next_player = self.get_all_legal_moves()
@@ -336,6 +559,11 @@ class RollerballBoard:
             else:
                 self.game_over = True
                 self.winner = 'draw'
+        elif self.is_draw_by_rule():
+            # Checked only once mate/stalemate is ruled out, so a mating move
+            # on the last no-progress ply still wins
+            self.game_over = True
+            self.winner = 'draw'
         
         if not self.find_king('white'):
             self.game_over = True
@@ -346,81 +574,6 @@ class RollerballBoard:
 
     def evaluate_board(self, player_color_for_eval):
         score = 0
-        piece_values = {
-            'P': 10, 'N': 30, 'B': 30, 'R': 50, 'Q': 90, 'K': 900,
-            'p': -10, 'n': -30, 'b': -30, 'r': -50, 'q': -90, 'k': -900
-        }
-
-        pawn_pst = [
-            [0,  0,  0,  0,  0,  0,  0],
-            [50, 50, 50, 50, 50, 50, 50],
-            [10, 10, 20, 30, 20, 10, 10],
-            [ 5,  5, 10, 25, 10,  5,  5],
-            [ 0,  0,  0, 20,  0,  0,  0],
-            [ 5, -5,-10,  0, -10, -5,  5],
-            [ 0,  0,  0,  0,  0,  0,  0]
-        ]
-
-        knight_pst = [
-            [-50,-40,-30,-30,-30,-40,-50],
-            [-40,-20,  0,  0,  0,-20,-40],
-            [-30,  0, 10, 15, 10,  0,-30],
-            [-30,  5, 15, 20, 15,  5,-30],
-            [-30,  0, 15, 20, 15,  0,-30],
-            [-40,-20,  0,  5,  0,-20,-40],
-            [-50,-40,-30,-30,-30,-40,-50]
-        ]
-
-        bishop_pst = [
-            [-20,-10,-10,-10,-10,-10,-20],
-            [-10,  0,  0,  0,  0,  0,-10],
-            [-10,  0,  5, 10,  5,  0,-10],
-            [-10,  5,  5, 10,  5,  5,-10],
-            [-10,  0, 10, 10, 10,  0,-10],
-            [-10, 10,  0,  0,  0, 10,-10],
-            [-20,-10,-10,-10,-10,-10,-20]
-        ]
-
-        rook_pst = [
-            [ 0,  0,  0,  5,  0,  0,  0],
-            [-5,  0,  0,  0,  0,  0, -5],
-            [-5,  0,  0,  0,  0,  0, -5],
-            [-5,  0,  0,  0,  0,  0, -5],
-            [-5,  0,  0,  0,  0,  0, -5],
-            [-5,  0,  0,  0,  0,  0, -5],
-            [ 0,  0,  0,  5,  0,  0,  0]
-        ]
-
-        queen_pst = [
-            [-20,-10,-10, -5, -10,-10,-20],
-            [-10,  0,  0,  0,  0,  0,-10],
-            [-10,  0,  5,  5,  5,  0,-10],
-            [ -5,  0,  5,  5,  5,  0, -5],
-            [  0,  0,  5,  5,  5,  0, -5],
-            [-10,  5,  0,  0,  0,  5,-10],
-            [-20,-10,-10, -5,-10,-10,-20]
-        ]
-
-        king_pst_middle_game = [
-            [-30,-40,-40,-50,-40,-40,-30],
-            [-30,-40,-40,-50,-40,-40,-30],
-            [-30,-40,-40,-50,-40,-40,-30],
-            [-30,-40,-40,-50,-40,-40,-30],
-            [-20,-30,-30,-40,-30,-30,-20],
-            [-10,-20,-20,-20,-20,-20,-10],
-            [ 20, 30, 10,  0, 10, 30, 20]
-        ]
-
-        king_pst_end_game = [
-            [-50,-40,-30,-20,-30,-40,-50],
-            [-30,-20,-10,  0,-10,-20,-30],
-            [-30,-10, 20, 30, 20,-10,-30],
-            [-30,-10, 30, 40, 30,-10,-30],
-            [-30,-10, 30, 40, 30,-10,-30],
-            [-30,-20,-10,  0,-10,-20,-30],
-            [-50,-40,-30,-20,-30,-40,-50]
-        ]
-
         num_queens = 0
         for r_idx in range(7):
             for c_idx in range(7):
@@ -442,26 +595,26 @@ class RollerballBoard:
                 piece_color = self.get_piece_color(piece)
                 is_white = (piece_color == 'white')
                 
-                score += piece_values.get(piece, 0)
+                score += PIECE_VALUES.get(piece, 0)
 
                 pst_value = 0
                 r_effective = r_idx if is_white else 6 - r_idx
                 
                 if piece.upper() == 'P':
-                    pst_value = pawn_pst[r_effective][c_idx]
+                    pst_value = PAWN_PST[r_effective][c_idx]
                 elif piece.upper() == 'N':
-                    pst_value = knight_pst[r_effective][c_idx]
+                    pst_value = KNIGHT_PST[r_effective][c_idx]
                 elif piece.upper() == 'B':
-                    pst_value = bishop_pst[r_effective][c_idx]
+                    pst_value = BISHOP_PST[r_effective][c_idx]
                 elif piece.upper() == 'R':
-                    pst_value = rook_pst[r_effective][c_idx]
+                    pst_value = ROOK_PST[r_effective][c_idx]
                 elif piece.upper() == 'Q':
-                    pst_value = queen_pst[r_effective][c_idx]
+                    pst_value = QUEEN_PST[r_effective][c_idx]
                 elif piece.upper() == 'K':
                     if is_endgame:
-                        pst_value = king_pst_end_game[r_effective][c_idx]
+                        pst_value = KING_PST_END_GAME[r_effective][c_idx]
                     else:
-                        pst_value = king_pst_middle_game[r_effective][c_idx]
+                        pst_value = KING_PST_MIDDLE_GAME[r_effective][c_idx]
                 
                 score += pst_value if is_white else -pst_value
 
@@ -575,4 +728,4 @@ class RollerballBoard:
         if player_color_for_eval == 'black':
             score = -score
 
-        return score
\ No newline at end of file
+        return score
\ No newline at end of file
@@ -0,0 +1,213 @@
+# tune_eval.py - fits the material and piece-square weights of evaluate_board
+# to game results.
+#
+# Usage: python tune_eval.py positions.txt [--epochs 2000] [--output eval_weights.json]
+#
+# Each line of the corpus is "<rows> <w|b> <result>", where <rows> is the board
+# as 7 rows joined by '/' (using the same letters as RollerballBoard, '.' or a
+# digit run for empty squares) and <result> is from white's point of view:
+# 1-0, 0-1, 1/2-1/2 (or 1, 0, 0.5).
+#
+# Features are extracted once into a NumPy matrix and cached next to the corpus
+# (<corpus>.features.npz), keyed on a hash of the corpus contents.
+
+import argparse
+import hashlib
+import inspect
+import os
+import sys
+
+import numpy as np
+
+import rollerball_chess
+from rollerball_chess import RollerballBoard, PIECE_VALUES, PIECE_SQUARE_TABLES
+
+# Kings are always on the board, so their material value cancels and is not tuned
+MATERIAL_PIECES = ['P', 'N', 'B', 'R', 'Q']
+PST_NAMES = list(PIECE_SQUARE_TABLES)
+NUM_FEATURES = len(MATERIAL_PIECES) + len(PST_NAMES) * 49
+
+RESULTS = {'1-0': 1.0, '0-1': 0.0, '1/2-1/2': 0.5}
+
+# Bump when the cached arrays change meaning in a way the cache key below
+# can't see
+FEATURE_CACHE_VERSION = 1
+
+
+def parse_position(line):
+    rows, side, result = line.split()
+    board = RollerballBoard()
+    board.board = []
+    for row in rows.split('/'):
+        squares = []
+        for ch in row:
+            if ch.isdigit():
+                squares.extend('.' * int(ch))
+            else:
+                squares.append(ch)
+        if len(squares) != 7:
+            raise ValueError(f"Bad row {row!r} in {line!r}")
+        board.board.append(squares)
+    if len(board.board) != 7:
+        raise ValueError(f"Expected 7 rows in {line!r}")
+    board.current_player = 'white' if side == 'w' else 'black'
+    board.hash = board.compute_hash()
+    if result in RESULTS:
+        return board, RESULTS[result]
+    return board, float(result)
+
+
+def current_weights():
+    weights = [PIECE_VALUES[piece] for piece in MATERIAL_PIECES]
+    for name in PST_NAMES:
+        for row in PIECE_SQUARE_TABLES[name]:
+            weights.extend(row)
+    return np.array(weights, dtype=np.float64)
+
+
+def extract_features(board):
+    # Mirrors the material and PST part of evaluate_board: white pieces count
+    # +1 and black pieces -1 on their side-relative square.
+    x = np.zeros(NUM_FEATURES, dtype=np.int8)
+    num_queens = sum(row.count('Q') + row.count('q') for row in board.board)
+    king_table = 'K_END_GAME' if num_queens <= 1 else 'K_MIDDLE_GAME'
+    for r in range(7):
+        for c in range(7):
+            piece = board.board[r][c]
+            if piece == '.':
+                continue
+            is_white = piece.isupper()
+            sign = 1 if is_white else -1
+            kind = piece.upper()
+            if kind in MATERIAL_PIECES:
+                x[MATERIAL_PIECES.index(kind)] += sign
+            name = king_table if kind == 'K' else kind
+            r_effective = r if is_white else 6 - r
+            offset = len(MATERIAL_PIECES) + PST_NAMES.index(name) * 49
+            x[offset + r_effective * 7 + c] += sign
+    return x
+
+
+def cache_key(corpus_data):
+    # The residual depends on evaluate_board's untuned terms and move
+    # generation, so the rollerball_chess source is part of the key along with
+    # the feature layout and extraction code.
+    h = hashlib.sha1()
+    h.update(corpus_data)
+    h.update(repr((FEATURE_CACHE_VERSION, MATERIAL_PIECES, PST_NAMES)).encode())
+    h.update(inspect.getsource(extract_features).encode())
+    h.update(inspect.getsource(rollerball_chess).encode())
+    return h.hexdigest()
+
+
+def load_corpus(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    digest = cache_key(data)
+    cache_path = path + '.features.npz'
+
+    if os.path.exists(cache_path):
+        cached = np.load(cache_path)
+        if str(cached['digest']) == digest:
+            return cached['features'], cached['residual'], cached['results']
+
+    weights = current_weights()
+    lines = [line for line in data.decode().splitlines() if line.strip() and not line.startswith('#')]
+    features = np.zeros((len(lines), NUM_FEATURES), dtype=np.int8)
+    residual = np.zeros(len(lines), dtype=np.float32)
+    results = np.zeros(len(lines), dtype=np.float32)
+    for i, line in enumerate(lines):
+        board, result = parse_position(line)
+        features[i] = extract_features(board)
+        # Everything evaluate_board adds beyond material and PST (pawn structure,
+        # mobility, king safety) stays fixed during tuning.
+        residual[i] = board.evaluate_board('white') - features[i] @ weights
+        results[i] = result
+        if (i + 1) % 1000 == 0:
+            print(f"Extracted {i + 1}/{len(lines)} positions")
+
+    np.savez_compressed(cache_path, digest=digest, features=features,
+                        residual=residual, results=results)
+    return features, residual, results
+
+
+def sigmoid(x):
+    # Clipped so positions with a missing king don't overflow exp
+    return 1.0 / (1.0 + np.exp(-np.clip(x, -500, 500)))
+
+
+def logistic_loss(scores, results, k):
+    p = np.clip(sigmoid(k * scores), 1e-7, 1 - 1e-7)
+    return -np.mean(results * np.log(p) + (1 - results) * np.log(1 - p))
+
+
+def fit_scale(scores, results):
+    # Pick the eval-to-probability scale for the starting weights, so tuning
+    # changes the weights rather than just stretching them.
+    candidates = np.logspace(-4, 0, 200)
+    losses = [logistic_loss(scores, results, k) for k in candidates]
+    return candidates[int(np.argmin(losses))]
+
+
+def tune(features, residual, results, weights, k, epochs, lr):
+    # Full-batch Adam on the logistic loss
+    x = features.astype(np.float32)
+    w = weights.astype(np.float64)
+    m = np.zeros_like(w)
+    v = np.zeros_like(w)
+    beta1, beta2, eps = 0.9, 0.999, 1e-8
+    n = len(results)
+    for epoch in range(1, epochs + 1):
+        scores = x @ w + residual
+        grad = k * (x.T @ (sigmoid(k * scores) - results)) / n
+        m = beta1 * m + (1 - beta1) * grad
+        v = beta2 * v + (1 - beta2) * grad * grad
+        m_hat = m / (1 - beta1 ** epoch)
+        v_hat = v / (1 - beta2 ** epoch)
+        w -= lr * m_hat / (np.sqrt(v_hat) + eps)
+        if epoch % 100 == 0 or epoch == epochs:
+            print(f"epoch {epoch}: loss {logistic_loss(x @ w + residual, results, k):.6f}")
+    return w
+
+
+def apply_weights(weights):
+    weights = [int(round(value)) for value in weights]
+    for i, piece in enumerate(MATERIAL_PIECES):
+        PIECE_VALUES[piece] = weights[i]
+        PIECE_VALUES[piece.lower()] = -weights[i]
+    offset = len(MATERIAL_PIECES)
+    for name in PST_NAMES:
+        for r in range(7):
+            PIECE_SQUARE_TABLES[name][r][:] = weights[offset + r * 7:offset + r * 7 + 7]
+        offset += 49
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tune evaluate_board weights on a position corpus.")
+    parser.add_argument('corpus')
+    parser.add_argument('--epochs', type=int, default=2000)
+    parser.add_argument('--lr', type=float, default=0.5)
+    parser.add_argument('--k', type=float, default=None, help="Eval-to-probability scale (fitted if omitted)")
+    parser.add_argument('--output', default=rollerball_chess.EVAL_WEIGHTS_FILE)
+    args = parser.parse_args(argv)
+
+    features, residual, results = load_corpus(args.corpus)
+    if len(results) == 0:
+        print("Corpus is empty.")
+        return 1
+    print(f"{len(results)} positions, {NUM_FEATURES} features")
+
+    weights = current_weights()
+    start_scores = features.astype(np.float32) @ weights + residual
+    k = args.k if args.k is not None else fit_scale(start_scores, results)
+    print(f"k = {k:.6f}, starting loss {logistic_loss(start_scores, results, k):.6f}")
+
+    weights = tune(features, residual, results, weights, k, args.epochs, args.lr)
+    apply_weights(weights)
+    rollerball_chess.save_eval_weights(args.output)
+    print(f"Wrote {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())